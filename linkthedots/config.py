@@ -1,4 +1,6 @@
+from . import schema
 from socket import gethostname
+from types import MappingProxyType
 import json
 
 
@@ -8,7 +10,57 @@ options = {
                   '(Warning: Can cause data loss!)'),
     'verbose': ('Used once (-v): Show summary of package changes. '
                 'Used twice (-vv): Behold! Every change is going to be listed!'),
-    'group_output': 'Display output in order or group by status'
+    'group_output': 'Display output in order or group by status',
+    'fold': ('Link directories owned by a single package as a whole '
+             '(like GNU Stow tree folding)')
+}
+
+
+# Config file layout
+RULE = schema.pair(schema.choice('include', 'exclude'), schema.words())
+CONTAINER = {
+    'source': schema.string,
+    'destination': schema.string,
+    'packages': schema.words(frozenset),
+    'destination_create': schema.boolean,
+    'pkg': schema.boolean,
+    'snapshot': schema.string,
+    'rules': schema.by_type({dict: schema.mapping(RULE), list: RULE},
+                            name='a dictionary of rules or a single rule')
+}
+OPTIONS = {option: schema.boolean for option in options}
+SETTINGS = {
+    'manifest': schema.string,
+    'metrics': schema.string,
+    'max_depth': schema.number,
+    'max_entries': schema.number,
+    'max_memory': schema.number
+}
+GENERAL = schema.record({
+    **OPTIONS,
+    **SETTINGS,
+    'containers': schema.mapping(
+        schema.record(CONTAINER, shorthand='source'))
+})
+HOST = schema.record({
+    **OPTIONS,
+    **SETTINGS,
+    'name': schema.string,
+    'containers': schema.mapping(
+        schema.record(CONTAINER, shorthand='destination'))
+}, required=('containers',))
+
+# Values of keys missing from both general and host sections
+DEFAULTS = {
+    'options': dict.fromkeys(options, False),
+    'settings': dict.fromkeys(SETTINGS),
+    'container': {
+        'packages': None,
+        'destination_create': False,
+        'pkg': False,
+        'snapshot': None,
+        'rules': MappingProxyType({})
+    }
 }
 
 
@@ -22,6 +74,10 @@ class Config():
         except json.decoder.JSONDecodeError as e:
             raise Warning(f'Incorrectly formatted config file ({e})')
 
+        if not isinstance(self.config, dict):
+            raise Warning('Incorrectly formatted config file '
+                          '(must be a dictionary of sections)')
+
     def _get_section(self, hostname=gethostname()):
         """
         Checks if hostname equals to "name" key value in any section.
@@ -29,110 +85,93 @@ class Config():
         """
         hostname = hostname.lower()
         for sect, value in self.config.items():
-            sect_host = value.get('name', '').lower()
-            if sect_host == hostname:
+            sect_host = value.get('name', '') if isinstance(value, dict) else ''
+            if str(sect_host).lower() == hostname:
                 return sect
 
         return hostname
 
-    def read(self):
-        def dict_update(base, extra):
-            """ Copies over `extra` to `base` AND overwrites keys """
-            # Check if there are any nested dicts
-            if any(map(lambda x: isinstance(x, dict), base.values())):
-                for k, v in extra.items():
-                    try:
-                        dict_update(base[k], v)
-                    except (KeyError, AttributeError):
-                        base[k] = v
-            else:
-                base.update(extra)
-            return base
-
+    def read(self, hostname=None):
+        """
+        Validates the general and host sections and merges them into
+        read-only host options, with every key filled in.
+        All problems are reported at once, along with their JSON path.
+        """
         # Get config section
-        try:
-            section = self._get_section()
-            general_bool = {
-                k: v for k, v in self.config['general'].items()
-                if k in options.keys()}
-            # Initiate host bool options on top of general
-            host = dict_update(general_bool, self.config[section])
-            if 'name' not in host:
-                host['name'] = section
-        except KeyError:
+        section = (self._get_section(hostname) if hostname
+                   else self._get_section())
+        if section not in self.config:
             if section in map(lambda x: x.lower(), self.config.keys()):
                 raise Warning('Section names must be in lowercase.')
             raise Warning(
                 f'Section matching machine\'s hostname "{section}" wasn\'t found.')
 
-        # Some tweaks to the containers section
-        try:
-            for ctnr, items in host['containers'].items():
-                # Copy source from general section
-                try:
-                    # Try to copy over container options from general section
-                    general_ctnr = self.config['general']['containers'][ctnr]
-                    host['containers'][ctnr] = dict_update(general_ctnr, items)
-                except AttributeError:  # Raises if not a dict
-                    try:
-                        if 'source' not in items:
-                            # Explicitly set source
-                            host['containers'][ctnr]['source'] = general_ctnr
-                    except TypeError:
-                        # Explicitly set src/dest since both are missing
-                        host['containers'][ctnr] = {
-                            'source': general_ctnr or None,
-                            'destination': items
-                        }
-                        continue  # No need to further process
-                except KeyError:
-                    raise Warning(
-                        f'Container "{ctnr}" doesn\'t appear in "general".')
-                except TypeError:
-                    raise Warning('Improperly formatted general "Containers".')
-                except ValueError:
-                    raise Warning(
-                        f'Container "{ctnr}" improperly formatted.')
-
-                # Convert packages to a proper list
-                if items.get('packages'):
-                    try:
-                        host['containers'][ctnr]['packages'] = items[
-                            'packages'].split()
-                    except AttributeError:
-                        pass
-                    finally:
-                        host['containers'][ctnr]['packages'] = set(
-                            host['containers'][ctnr]['packages'])
-
-                # Convert rules' files (second list item) to a proper list
-                try:
-                    is_pkg = host['containers'][ctnr].get('pkg')
-                    rules = host['containers'][ctnr].get('rules', {})
-
-                    if rules and is_pkg:
-                        rules = {ctnr: rules}
-                        host['containers'][ctnr]['rules'] = rules
-
-                    for pkg, (rule, files) in rules.items():
-                        try:
-                            host['containers'][ctnr]['rules'][pkg][1] = (
-                                files.split())
-                        except AttributeError:
-                            # Already a list
-                            pass
-                except TypeError:
-                    raise Warning(
-                        f'Improperly formatted rule "{pkg}" in "{container}" container.')
-                except (AttributeError, KeyError, ValueError):
-                    err = f'Improperly formatted rules for "{ctnr}"'
-                    if is_pkg:
-                        err += ' (maybe because "pkg" is True?)'
-                    raise Warning(err)
-        except AttributeError:
-            raise Warning(
-                f'Improperly formatted "containers" value in "{section}".')
-        except KeyError:
-            raise Warning(f'No "containers" key in "{section}".')
+        errors = []
+        path = schema.join('$', section)
+        general = GENERAL(self.config.get('general', {}), '$.general', errors)
+        host = HOST(self.config[section], path, errors)
+        if schema.INVALID in (general, host):
+            raise Warning(self._format_errors(errors))
+
+        # Merge each container with its general counterpart
+        containers = {}
+        general_ctnrs = general.get('containers', {})
+        for ctnr, items in host.get('containers', {}).items():
+            ctnr_path = schema.join(f'{path}.containers', ctnr)
+            if ctnr not in general_ctnrs:
+                # Don't bother if general containers are broken anyway
+                if ('containers' in general or
+                        'containers' not in self.config.get('general', {})):
+                    errors.append(
+                        f'{ctnr_path}: Container "{ctnr}" doesn\'t appear in '
+                        '"general".')
+                continue
+
+            general_ctnr = general_ctnrs[ctnr]
+            opts = {**DEFAULTS['container'], **general_ctnr, **items}
+
+            for key in ('source', 'destination'):
+                if not opts.get(key):
+                    errors.append(
+                        f'{ctnr_path}: No "{key}" set (in either section).')
+
+            # Rules are merged per package
+            rules = (general_ctnr.get('rules'), items.get('rules'))
+            if all(isinstance(r, MappingProxyType) for r in rules):
+                opts['rules'] = MappingProxyType({**rules[0], **rules[1]})
+
+            rules = opts['rules']
+            if opts['pkg']:
+                if isinstance(rules, tuple):
+                    opts['rules'] = MappingProxyType({ctnr: rules})
+                elif rules:
+                    errors.append(
+                        f'{ctnr_path}.rules: Must be a single rule since '
+                        '"pkg" is true.')
+            elif isinstance(rules, tuple):
+                errors.append(
+                    f'{ctnr_path}.rules: Must be a dictionary of rules '
+                    '(maybe "pkg" should be true?).')
+
+            containers[ctnr] = MappingProxyType(opts)
+
+        if errors:
+            raise Warning(self._format_errors(errors))
+
+        # Initiate host options on top of general
+        host = {
+            **DEFAULTS['options'],
+            **DEFAULTS['settings'],
+            **{k: v for k, v in general.items() if k != 'containers'},
+            'name': section,
+            **host,
+            'containers': MappingProxyType(containers)
+        }
+
+        return MappingProxyType(host)
 
-        return host
+    @staticmethod
+    def _format_errors(errors):
+        if len(errors) == 1:
+            return errors[0]
+        return '\n'.join([f'{len(errors)} problems found:', *errors])
@@ -0,0 +1,110 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+from .config import Config
+from .stow import Stow, packages
+
+
+def reroot(path, root):
+    """
+    Places a destination path under root.
+    The root stands for the home directory ("~"),
+    while absolute paths are placed inside it (like in a chroot).
+    """
+    if path == '~' or path.startswith('~/'):
+        return os.path.normpath(os.path.join(root, path[2:]))
+    return os.path.join(root, os.path.expanduser(path).lstrip(os.sep))
+
+
+def plan(options, cache):
+    """
+    Collects the files of every package in the host options.
+    Destinations are kept relative to the container's destination,
+    so the same plan can be applied to any root.
+    Every package is walked only once: the walk is kept in `cache`, and
+    the hints and rules of each host are applied to it. A package that
+    couldn't be walked gets the Warning instead of its files.
+    """
+    output = []
+    extra_opts = {k: v for k, v in options.items() if k != 'containers'}
+    # Folded links into any container (selected or not) are recognized
+    extra_opts['sources'] = [opt['source']
+                             for opt in options['containers'].values()]
+    selected = options.get('select_containers')
+    for ctnr, opts in options['containers'].items():
+        if selected and ctnr not in selected:
+            continue
+
+        for pkg, stow_args in packages(ctnr, {**opts, **extra_opts}):
+            stow = Stow(**stow_args)
+            key = (stow.src, stow.snapshot, stow.max_depth, stow.max_entries,
+                   stow.max_memory)
+
+            if key not in cache:
+                try:
+                    cache[key] = list(stow.walk(stow.src))
+                except Warning as e:
+                    # Over a walking limit, skip just this package
+                    cache[key] = e
+
+            files = cache[key]
+            if not isinstance(files, Warning):
+                try:
+                    files = [(src, os.path.relpath(dest, stow.dest))
+                             for src, dest in stow.collect(walked=files)]
+                except Warning as e:
+                    files = e
+
+            output.append((ctnr, pkg, opts['destination_create'],
+                           stow_args, files))
+
+    return output
+
+
+def apply(root, jobs):
+    """ Creates the planned links under root """
+    output = []
+    for ctnr, pkg, destination_create, stow_args, files in jobs:
+        if isinstance(files, Warning):
+            output.append((ctnr, pkg, files))
+            continue
+
+        dest = reroot(stow_args['destination'], root)
+
+        # Same as a regular run, don't create a missing destination
+        # unless explicitly asked to
+        if not (destination_create or os.access(dest, os.W_OK)):
+            output.append((ctnr, pkg, None))
+            continue
+
+        stow = Stow(**{**stow_args, 'destination': dest})
+        files = [(src, os.path.normpath(os.path.join(stow.dest, rel)))
+                 for src, rel in files]
+        output.append((ctnr, pkg, stow.create(files)))
+
+    return output
+
+
+def deploy(conf, targets, workers=None, **overrides):
+    """
+    Stows a config file on many (hostname, root) targets at once.
+    Every package is walked once (whatever the number of hosts), then links
+    are created on each root in parallel worker processes.
+    Returns a dictionary of (hostname, root) -> list of
+    (container, package, stow result or None if destination is inaccessible
+    or a Warning if the package was skipped).
+    """
+    config = Config(conf=conf)
+
+    plans, cache = {}, {}
+    for hostname, _ in targets:
+        if hostname not in plans:
+            options = {**config.read(hostname=hostname), **overrides}
+            plans[hostname] = plan(options, cache)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {(hostname, root): executor.submit(apply, root,
+                                                     plans[hostname])
+                   for hostname, root in targets}
+
+        return {target: future.result() for target, future in futures.items()}
@@ -1,6 +1,160 @@
+from functools import lru_cache
 import os
+import resource
+import sys
+import tempfile
+
+# How often (in entries) memory usage is checked while walking
+MEMORY_CHECK_INTERVAL = 4096
+
+# How many (source dir, destination dir) pairs to remember for relative links
+RELPATH_CACHE_SIZE = 1024
 
 
 def shrinkuser(path):
     """ Reverts expanduser() """
     return path.replace(os.path.expanduser('~'), '~')
+
+
+def atomic_write(path, text, mode=0o644):
+    """
+    Writes text (or bytes) to path through a temporary file, so readers
+    never see a partially written file.
+    """
+    path = os.path.expanduser(path)
+    directory = os.path.dirname(path) or os.curdir
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp = tempfile.mkstemp(dir=directory,
+                               prefix=f'.{os.path.basename(path)}-')
+    try:
+        with os.fdopen(fd, 'wb' if isinstance(text, bytes) else 'w') as f:
+            f.write(text)
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+@lru_cache(maxsize=RELPATH_CACHE_SIZE)
+def _relpath(src_dir, dest_dir):
+    return os.path.relpath(src_dir, dest_dir)
+
+
+def relative_link(src, dest):
+    """
+    Returns the relative target for a link at dest pointing to src
+    (same as os.path.relpath(src, os.path.dirname(dest))).
+    Files of the same directory share the directories' relative path,
+    so it's only computed once for all of them.
+    """
+    src_dir, name = os.path.split(src)
+    prefix = _relpath(src_dir, os.path.dirname(dest))
+    return name if prefix == os.curdir else f'{prefix}{os.sep}{name}'
+
+
+def memory_used():
+    """ Returns the current resident memory of the process, in bytes """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        # No procfs: fall back to the peak (in bytes on macOS, KiB elsewhere)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def walk(top, descend=None, max_depth=None, max_entries=None,
+         max_memory=None):
+    """
+    Streams (root, name, is_dir) for everything under top, one entry at a time.
+    Works like os.walk(followlinks=True) without listing whole directories
+    up front. A directory is only entered if descend(root, name) is true.
+    Symlink loops are skipped. Going over any of the limits (depth, number of
+    entries, resident memory of the process in MiB) raises a Warning.
+    """
+    def scan(path):
+        try:
+            return os.scandir(path)
+        except OSError:
+            # Unreadable, just like os.walk
+            return iter(())
+
+    try:
+        st = os.stat(top)
+    except OSError:
+        return
+
+    # Directories leading to the current one, to detect loops
+    ancestors = [(st.st_dev, st.st_ino)]
+    stack = [(top, scan(top))]
+    count = 0
+    try:
+        while stack:
+            root, entries = stack[-1]
+            try:
+                entry = next(entries)
+            except (StopIteration, OSError):
+                getattr(entries, 'close', lambda: None)()
+                stack.pop()
+                ancestors.pop()
+                continue
+
+            count += 1
+            if max_entries is not None and count > max_entries:
+                raise Warning(f'"{top}" has more than {max_entries} entries.')
+            if (max_memory is not None and
+                    count % MEMORY_CHECK_INTERVAL == 0):
+                # Memory of the whole process, including other packages
+                # that are being walked at the same time
+                if memory_used() > max_memory * 1024 * 1024:
+                    raise Warning(
+                        f'Walking "{top}" used more than {max_memory} MiB.')
+
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+
+            yield root, entry.name, is_dir
+
+            if is_dir and (descend is None or descend(root, entry.name)):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+
+                if (st.st_dev, st.st_ino) in ancestors:
+                    continue  # Symlink loop
+
+                if max_depth is not None and len(stack) > max_depth:
+                    raise Warning(f'"{entry.path}" is nested more than '
+                                  f'{max_depth} directories deep.')
+
+                ancestors.append((st.st_dev, st.st_ino))
+                stack.append((entry.path, scan(entry.path)))
+    finally:
+        for _, entries in stack:
+            getattr(entries, 'close', lambda: None)()
+
+
+def replay(entries, top, descend=None):
+    """
+    Streams recorded walk() entries that are under top, as if they were
+    walked with descend (entries of skipped directories are left out).
+    """
+    prefix, skipped = os.path.join(top, ''), set()
+    for root, name, is_dir in entries:
+        if root != top and not root.startswith(prefix):
+            continue
+
+        if root in skipped:
+            if is_dir:
+                skipped.add(os.path.join(root, name))
+            continue
+
+        yield root, name, is_dir
+
+        if is_dir and descend is not None and not descend(root, name):
+            skipped.add(os.path.join(root, name))
@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+
+from .functions import atomic_write
+
+# Drift states and the exit code bit of each
+DRIFT = {
+    'missing': 2,  # Nothing at the destination
+    'foreign': 4,  # Not a link, or a link pointing somewhere else
+    'dangling': 8  # The right link, but its target is gone
+}
+
+
+def load(path):
+    """ Returns the recorded links (destination -> link target) """
+    try:
+        with open(os.path.expanduser(path), 'r') as m:
+            return json.load(m)['links']
+    except FileNotFoundError:
+        raise Warning(f'Manifest "{path}" not found. Run a (non-dry) stow '
+                      'to record one.')
+    except (json.decoder.JSONDecodeError, KeyError, TypeError) as e:
+        raise Warning(f'Incorrectly formatted manifest "{path}" ({e})')
+
+
+def save(path, links):
+    """ Atomically replaces the manifest with links """
+    atomic_write(path, json.dumps({'links': links}, indent=1, sort_keys=True))
+
+
+def _target(dest, link):
+    """ Returns the absolute target of a link at dest """
+    return os.path.normpath(os.path.join(os.path.dirname(dest), link))
+
+
+def owned(links, sources):
+    """ Returns the links pointing inside any of the source directories """
+    sources = tuple(os.path.join(os.path.normpath(s), '') for s in sources)
+    return {dest: target for dest, target in links.items()
+            if _target(dest, target).startswith(sources)}
+
+
+def record(links, stow_result):
+    """ Updates links (destination -> link target) from a Stow result """
+    for path in stow_result['unfolded']:
+        links.pop(path, None)
+    links.update(stow_result['links'])
+    return links
+
+
+def state(dest, target):
+    """ Checks a single link using readlink/stat only """
+    try:
+        if _target(dest, os.readlink(dest)) != _target(dest, target):
+            return 'foreign'
+    except FileNotFoundError:
+        return 'missing'
+    except OSError:
+        # Exists but isn't a link
+        return 'foreign'
+
+    try:
+        os.stat(dest)
+    except OSError:
+        return 'dangling'
+
+    return 'ok'
+
+
+def check(links, workers=None):
+    """
+    Checks all links in parallel.
+    Returns a dictionary of state -> list of (destination, link target).
+    """
+    output = {s: [] for s in ('ok', *DRIFT)}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        states = executor.map(lambda link: state(*link), links.items())
+        for link, link_state in zip(links.items(), states):
+            output[link_state].append(link)
+
+    return output
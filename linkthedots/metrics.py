@@ -0,0 +1,119 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import Lock
+import os
+import re
+import time
+
+from .functions import atomic_write
+from .stow import Stow
+
+PREFIX = 'linkthedots'
+
+
+class Metrics():
+    """
+    Collects statistics of a run and writes them in Prometheus
+    node-exporter textfile format.
+    """
+    def __init__(self):
+        self.start = time.time()
+        self.config_duration = 0
+        self.containers = defaultdict(float)  # container -> seconds
+        # (container, phase) -> seconds, summed over packages
+        self.durations = defaultdict(float)
+        self.links = defaultdict(int)  # (container, state) -> count
+        self.walked = defaultdict(int)  # container -> entries
+        # Packages are handled by several threads at once
+        self.lock = Lock()
+
+    @contextmanager
+    def timer(self, container, phase=None):
+        """ Times a phase of a container (or the whole of it) """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self.lock:
+                if phase:
+                    self.durations[(container, phase)] += duration
+                else:
+                    self.containers[container] += duration
+
+    def timed(self, container, phase, func, *args):
+        """ Calls func(*args) while timing it """
+        with self.timer(container, phase):
+            return func(*args)
+
+    def add_stow(self, container, stow, stow_result):
+        """ Counts walked entries and links of a stowed package """
+        with self.lock:
+            self.walked[container] += stow.walked
+            for state in Stow.STATES:
+                self.links[(container, state)] += len(
+                    stow_result['results'][state])
+
+    def _last_success(self, path):
+        """ Returns the last success timestamp from a previous file """
+        try:
+            with open(os.path.expanduser(path), 'r') as f:
+                match = re.search(
+                    rf'^{PREFIX}_last_success_timestamp_seconds (\S+)$',
+                    f.read(), re.MULTILINE)
+                return float(match.group(1)) if match else None
+        except (OSError, ValueError):
+            return None
+
+    def format(self, success=True, last_success=None):
+        def labels(**kwargs):
+            pairs = [f'{k}="{escape(v)}"' for k, v in sorted(kwargs.items())]
+            return '{' + ','.join(pairs) + '}' if pairs else ''
+
+        def escape(value):
+            return (str(value).replace('\\', r'\\').replace('"', r'\"')
+                    .replace('\n', r'\n'))
+
+        now = time.time()
+        metrics = [
+            ('run_duration_seconds', 'Duration of the whole run.',
+             [({}, now - self.start)]),
+            ('config_duration_seconds', 'Time spent reading the config.',
+             [({}, self.config_duration)]),
+            ('container_duration_seconds', 'Time spent on each container.',
+             [({'container': c}, v)
+              for c, v in sorted(self.containers.items())]),
+            ('phase_duration_seconds',
+             'Time spent in each phase, summed over packages.',
+             [({'container': c, 'phase': p}, v)
+              for (c, p), v in sorted(self.durations.items())]),
+            ('links', 'Number of links by their resulting state.',
+             [({'container': c, 'state': s}, v)
+              for (c, s), v in sorted(self.links.items())]),
+            ('walked_entries', 'Number of files and directories walked.',
+             [({'container': c}, v) for c, v in sorted(self.walked.items())]),
+            ('last_run_success', 'Whether the last run finished.',
+             [({}, int(success))])
+        ]
+
+        last_success = now if success else last_success
+        if last_success is not None:
+            metrics.append(('last_success_timestamp_seconds',
+                            'Time of the last finished run.',
+                            [({}, last_success)]))
+
+        output = []
+        for name, desc, samples in metrics:
+            output += [f'# HELP {PREFIX}_{name} {desc}',
+                       f'# TYPE {PREFIX}_{name} gauge']
+            output += [f'{PREFIX}_{name}{labels(**lbl)} {value}'
+                       if isinstance(value, int) else
+                       f'{PREFIX}_{name}{labels(**lbl)} {value:.6f}'
+                       for lbl, value in samples]
+
+        return '\n'.join(output) + '\n'
+
+    def write(self, path, success=True):
+        """ Atomically writes the metrics file """
+        text = self.format(success, self._last_success(path))
+        atomic_write(path, text)
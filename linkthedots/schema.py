@@ -0,0 +1,120 @@
+"""
+Tiny declarative schema for the config file.
+
+Schemas are built once (at import time) out of the validators below.
+A validator takes a value and its JSON path, and returns the normalized value.
+Problems are appended to `errors` instead of being raised, so a single pass
+reports all of them. Invalid values are returned as `INVALID`.
+"""
+from types import MappingProxyType
+import re
+
+INVALID = object()
+
+
+def join(path, key):
+    """ Appends key to a JSON path """
+    if re.fullmatch(r'[A-Za-z_]\w*', key):
+        return f'{path}.{key}'
+    return f'{path}["{key}"]'
+
+
+def typed(*types, name):
+    """ Accepts values of the given types only """
+    def validate(value, path, errors):
+        # bool is an int, but never the other way around
+        if isinstance(value, types) and not (
+                isinstance(value, bool) and bool not in types):
+            return value
+        errors.append(f'{path}: Must be {name}.')
+        return INVALID
+    return validate
+
+
+boolean = typed(bool, name='true/false')
+string = typed(str, name='a string')
+number = typed(int, name='a whole number')
+
+
+def choice(*choices):
+    """ Accepts one of the given values """
+    def validate(value, path, errors):
+        if value in choices:
+            return value
+        options = '/'.join(f'"{c}"' for c in choices)
+        errors.append(f'{path}: Must be one of {options}.')
+        return INVALID
+    return validate
+
+
+def words(kind=tuple):
+    """ Accepts a list of strings or a space-separated string """
+    def validate(value, path, errors):
+        if isinstance(value, str):
+            return kind(value.split())
+        if (isinstance(value, list) and
+                all(isinstance(word, str) for word in value)):
+            return kind(value)
+        errors.append(
+            f'{path}: Must be a list or a space-separated string.')
+        return INVALID
+    return validate
+
+
+def pair(first, second):
+    """ Accepts a two-item list """
+    def validate(value, path, errors):
+        if isinstance(value, list) and len(value) == 2:
+            values = (first(value[0], f'{path}[0]', errors),
+                      second(value[1], f'{path}[1]', errors))
+            return INVALID if INVALID in values else values
+        errors.append(f'{path}: Must be a list of two items.')
+        return INVALID
+    return validate
+
+
+def mapping(values):
+    """ Accepts a dictionary, validating each of its values """
+    def validate(value, path, errors):
+        if not isinstance(value, dict):
+            errors.append(f'{path}: Must be a dictionary.')
+            return INVALID
+        output = {k: values(v, join(path, k), errors)
+                  for k, v in value.items()}
+        return MappingProxyType(
+            {k: v for k, v in output.items() if v is not INVALID})
+    return validate
+
+
+def record(fields, required=(), shorthand=None):
+    """
+    Accepts a dictionary with known keys.
+    Unknown keys are dropped, invalid ones are left out.
+    If `shorthand` is set, a string is accepted as the value of that key.
+    """
+    def validate(value, path, errors):
+        if shorthand and isinstance(value, str):
+            value = {shorthand: value}
+        if not isinstance(value, dict):
+            errors.append(f'{path}: Must be a dictionary.')
+            return INVALID
+
+        for key in required:
+            if key not in value:
+                errors.append(f'{path}: Missing "{key}" key.')
+
+        output = {k: fields[k](v, join(path, k), errors)
+                  for k, v in value.items() if k in fields}
+        return {k: v for k, v in output.items() if v is not INVALID}
+    return validate
+
+
+def by_type(validators, name):
+    """ Picks a validator according to the type of the value """
+    def validate(value, path, errors):
+        for kind, validator in validators.items():
+            if isinstance(value, kind):
+                return validator(value, path, errors)
+        errors.append(f'{path}: Must be {name}.')
+        return INVALID
+    return validate
@@ -0,0 +1,193 @@
+"""
+Snapshots of a container's source tree, so it doesn't have to be walked again.
+
+The file is read through mmap without parsing it as a whole:
+
+    header   magic, number of records
+    records  fixed size, sorted by path (see RECORD)
+    strings  the paths themselves (relative to the container)
+
+Since records are sorted, everything under a directory is a contiguous range
+that is found by binary search. A snapshot is only trusted when the
+modification times of all recorded directories in that range still match.
+"""
+import mmap
+import os
+import struct
+
+from .functions import atomic_write, walk as walk_tree
+
+MAGIC = b'LTDSNAP1'
+HEADER = struct.Struct('<8sI')
+# Path offset, path length, where the name starts, flags, mtime (dirs only)
+RECORD = struct.Struct('<IHHBq')
+
+# Flags
+DIR = 1
+
+
+def export(root, path, **limits):
+    """ Walks root and writes its snapshot to path """
+    paths = [b''] + [
+        os.fsencode(os.path.relpath(os.path.join(r, name), root))
+        for r, name, _ in walk_tree(root, **limits)]
+    paths.sort()
+
+    records, strings, offset = [], [], 0
+    for p in paths:
+        full = os.path.join(root, os.fsdecode(p))
+        name_start = p.rfind(b'/') + 1
+        flags, mtime = 0, 0
+        if os.path.isdir(full):
+            flags, mtime = DIR, os.stat(full).st_mtime_ns
+
+        records.append(RECORD.pack(offset, len(p), name_start, flags, mtime))
+        strings.append(p)
+        offset += len(p)
+
+    atomic_write(path,
+                 b''.join([HEADER.pack(MAGIC, len(paths)), *records,
+                           *strings]))
+    return len(paths)
+
+
+class Snapshot():
+    def __init__(self, path):
+        try:
+            with open(os.path.expanduser(path), 'rb') as f:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, self.count = HEADER.unpack_from(self.mm, 0)
+        except (OSError, ValueError, struct.error):
+            raise Warning(f'Snapshot "{path}" is unreadable.')
+
+        self.strings = HEADER.size + self.count * RECORD.size
+        if magic != MAGIC:
+            self.mm.close()
+            raise Warning(f'"{path}" is not a snapshot.')
+        if len(self.mm) < self.strings:
+            # Truncated (or partially published)
+            self.mm.close()
+            raise Warning(f'Snapshot "{path}" is incomplete.')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.mm.close()
+
+    def _path(self, offset, length, name_start):
+        start = self.strings + offset
+        if start + length > len(self.mm) or name_start > length:
+            raise Warning('Snapshot is corrupt.')
+        return self.mm[start:start + length]
+
+    def _record(self, i):
+        offset, length, name_start, flags, mtime = RECORD.unpack_from(
+            self.mm, HEADER.size + i * RECORD.size)
+        path = self._path(offset, length, name_start)
+        return path, name_start, flags, mtime
+
+    def _records(self, lo, hi):
+        """ Yields (path, name start, flags, mtime) of records lo to hi """
+        table = self.mm[HEADER.size + lo * RECORD.size:
+                        HEADER.size + hi * RECORD.size]
+        for offset, length, name_start, flags, mtime in RECORD.iter_unpack(
+                table):
+            path = self._path(offset, length, name_start)
+            yield path, name_start, flags, mtime
+
+    def _find(self, path):
+        """ Returns the index of the first record not below path """
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._record(mid)[0] < path:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def span(self, root, rel):
+        """
+        Returns the range of records under rel (a path relative to root),
+        or None if rel isn't recorded or anything in it changed since.
+        """
+        rel = os.fsencode(rel)
+        index = self._find(rel)
+        if index == self.count or self._record(index)[0] != rel:
+            return None
+
+        if rel:
+            lo, hi = self._find(rel + b'/'), self._find(rel + b'0')
+        else:
+            lo, hi = index + 1, self.count
+
+        for path, _, flags, mtime in (self._record(index),
+                                      *self._records(lo, hi)):
+            if not flags & DIR:
+                continue
+            try:
+                current = os.stat(os.path.join(root, os.fsdecode(path)))
+            except OSError:
+                return None
+            if current.st_mtime_ns != mtime:
+                return None
+
+        return lo, hi
+
+    def walk(self, top, rel, span, descend=None):
+        """ Same as functions.walk(top, descend), from the records in span """
+        rel = os.fsencode(rel)
+        roots, skipped = {rel: top}, set()
+        for path, name_start, flags, _ in self._records(*span):
+            parent, is_dir = path[:max(name_start - 1, 0)], flags & DIR
+
+            # Whatever is inside a skipped directory is skipped as well
+            if parent in skipped:
+                if is_dir:
+                    skipped.add(path)
+                continue
+
+            root, name = roots[parent], os.fsdecode(path[name_start:])
+            yield root, name, bool(is_dir)
+
+            if is_dir:
+                if descend is None or descend(root, name):
+                    roots[path] = os.path.join(root, name)
+                else:
+                    skipped.add(path)
+
+
+def walk(path, root, top, descend=None):
+    """
+    Walks top (inside root) from the snapshot at path.
+    Returns None if the snapshot can't be used, so the tree has to be walked.
+    """
+    rel = os.path.relpath(top, root)
+    if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+        return None
+    rel = '' if rel == os.curdir else rel
+
+    try:
+        snapshot = Snapshot(path)
+    except Warning:
+        return None
+
+    try:
+        # Also bounds-checks every record that is going to be walked
+        span = snapshot.span(root, rel)
+    except Warning:
+        span = None
+    if not span:
+        snapshot.close()
+        return None
+
+    def entries():
+        # Closed once walked (or when abandoned)
+        with snapshot:
+            yield from snapshot.walk(top, rel, span, descend)
+
+    return entries()
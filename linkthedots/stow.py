@@ -1,5 +1,48 @@
+from fnmatch import fnmatchcase
 import os
 
+from .functions import relative_link, replay, walk
+from .snapshot import walk as walk_snapshot
+
+
+def packages(container, opts):
+    """
+    Yields every package of a container along with its Stow arguments.
+    Packages can be narrowed down by glob patterns (`select_packages`)
+    and to a single path inside them (`select_path`).
+    """
+    source = os.path.expanduser(opts['source'])
+
+    # Work out packages to stow
+    if opts['pkg']:
+        pkgs = [container]
+    elif opts['packages'] is not None:
+        pkgs = opts['packages']
+    else:
+        pkgs = os.listdir(source)
+
+    patterns = opts.get('select_packages')
+    if patterns:
+        pkgs = [pkg for pkg in pkgs
+                if any(fnmatchcase(pkg, pattern) for pattern in patterns)]
+
+    for pkg in sorted(pkgs):
+        # Work out include/exclude files
+        rule, s_files = opts['rules'].get(pkg, ('include', ()))
+
+        stow_args = ('destination', 'name', 'dry_run', 'overwrite', 'fold',
+                     'max_depth', 'max_entries', 'max_memory', 'snapshot')
+        stow_args = {arg: opts[arg] for arg in stow_args}
+        stow_args.update({
+            'source': source if opts['pkg'] else os.path.join(source, pkg),
+            'container': source,
+            'path': opts.get('select_path'),
+            'sources': opts.get('sources', ()),
+            rule: s_files
+        })
+
+        yield pkg, stow_args
+
 
 class Stow():
     STATES = ('stowed', 'restowed', 'replaced', 'skipped')
@@ -10,6 +53,14 @@ class Stow():
                  name,
                  dry_run=False,
                  overwrite=False,
+                 fold=False,
+                 container=None,
+                 max_depth=None,
+                 max_entries=None,
+                 max_memory=None,
+                 path=None,
+                 snapshot=None,
+                 sources=(),
                  include=[],
                  exclude=[]):
         self.src = os.path.expanduser(source)
@@ -17,10 +68,46 @@ class Stow():
         self.hostname = name
         self.dry_run = dry_run
         self.overwrite = overwrite
+        self.fold = fold
+        # Links pointing inside the container are considered "ours"
+        self.root = os.path.expanduser(container or source)
+        self.container = os.path.realpath(self.root)
+        # ...as are links pointing inside any other container (`sources`)
+        self.sources = tuple(
+            os.path.join(os.path.realpath(os.path.expanduser(s)), '')
+            for s in (self.root, *sources))
+        # Walking limits (depth, number of entries, memory in MiB)
+        self.max_depth = max_depth
+        self.max_entries = max_entries
+        self.max_memory = max_memory
+        # Stow only this part of the package (relative to its source)
+        self.path = os.path.normpath(path).strip(os.sep) if path else None
+        if self.path == os.curdir:
+            self.path = None
+        # Snapshot of the container to use instead of walking it
+        self.snapshot = snapshot
         self.include = include
         self.exclude = exclude
+        # Number of entries seen by the last collect()
+        self.walked = 0
 
-    def collect(self):
+    def walk(self, top, descend=None):
+        """ Walks top (from the snapshot, while it's up to date) """
+        entries = None
+        if self.snapshot:
+            entries = walk_snapshot(self.snapshot, self.root, top, descend)
+        if entries is None:
+            entries = walk(top, descend, max_depth=self.max_depth,
+                           max_entries=self.max_entries,
+                           max_memory=self.max_memory)
+        return entries
+
+    def collect(self, walked=None):
+        """
+        Returns (source, destination) of every file to link.
+        The package is walked, unless the entries of a previous walk of
+        the whole package are given (`walked`).
+        """
         def need(item):
             """
             Decide whether a certain file/folder is needed
@@ -55,52 +142,205 @@ class Stow():
                 return False, False
             return base, name
 
-        output, replace_hints = {}, []
-        for root, dirs, files in os.walk(self.src, followlinks=True):
-            dest_dir = os.path.join(self.dest,
-                                    os.path.relpath(root, start=self.src))
-
-            base, name = check_name(dest_dir)
+        def descend(root, d):
+            """ Maps a directory meant for this host to its destination """
+            base, name = check_name(d)
+            if '#' in d:
+                dirty.update((root, os.path.join(root, d)))
             if not name:
                 # Do not descend into dirs not meant for this host
-                dirs[:] = []
-                continue
-            elif base != name:
-                replace_hints.append((base, name))
+                return False
+
+            dest_dirs[os.path.join(root, d)] = os.path.join(dest_dirs[root],
+                                                            name)
+            return True
+
+        def matches(parents, name):
+            """ Entries of parents with the name (once hints are resolved) """
+            output = []
+            for parent in parents:
+                try:
+                    entries = sorted(os.listdir(parent))
+                except OSError:
+                    continue
+                output += [os.path.join(parent, f) for f in entries
+                           if check_name(f)[1] == name]
+            return output
+
+        def add(src, dest):
+            """ Adds a file, host-specific ones ('#') taking priority """
+            if need(src):
+                dest = os.path.normpath(dest)
+                # Add only nonexistent or "own" files
+                if dest not in output.keys() or '#' in src:
+                    output[dest] = src
+                return True
+            return False
+
+        output, self.walked = {}, 0
+
+        # Start from the requested part of the package (if any).
+        # Like in a full walk, that's every entry meant for this host
+        # with a matching name, hints or not
+        tops, dest_dir = [self.src], self.dest
+        for part in self.path.split(os.sep) if self.path else []:
+            if part == os.pardir:
+                raise Warning(f'Path "{self.path}" is outside the package.')
+            name = check_name(part)[1]
+            if not name:
+                # Not meant for this host
+                return []
+            tops = matches(tops, name)
+            dest_dir = os.path.join(dest_dir, name)
+
+        # Single files
+        for top in tops:
+            if not os.path.isdir(top):
+                self.walked += 1
+                add(top, dest_dir)
+        tops = [top for top in tops if os.path.isdir(top)]
 
-            # Applying this for every child of the dir as well
-            for before, after in replace_hints:
-                dest_dir = dest_dir.replace(before, after, 1)
+        # Destination of every directory, and whether something inside it
+        # was left behind (needed for folding only)
+        dest_dirs, dirty = dict.fromkeys(tops, dest_dir), set()
+        dirty.update(top for top in tops if '#' in os.path.basename(top))
+
+        # Find out all the files to link
+        for top in tops:
+            entries = (self.walk(top, descend) if walked is None else
+                       replay(walked, top, descend))
+
+            for root, f, is_dir in entries:
+                self.walked += 1
+                if is_dir:
+                    continue
 
-            # Find out all the files to link
-            for f in files:
                 # Skip files not meant for this host
-                base, name = check_name(f)
+                name = check_name(f)[1]
+                if '#' in f:
+                    dirty.add(root)
                 if not name:
                     continue
 
-                src = os.path.join(root, f)
-                if need(src):
-                    dest = os.path.normpath(os.path.join(dest_dir, name))
-                    # Add only nonexistent or "own" files
-                    if dest not in output.keys() or '#' in src:
-                        output[dest] = src
+                if not add(os.path.join(root, f),
+                           os.path.join(dest_dirs[root], name)):
+                    dirty.add(root)
+
+        if self.fold:
+            # A part of a package can be folded as a whole, but never
+            # the package itself
+            boundaries = ((self.src,) if tops == [self.src] else
+                          tuple(os.path.dirname(top) for top in tops))
+            output = self._fold(output, dest_dirs, dirty, boundaries)
 
         output = [(v, k) for k, v in output.items()]
 
         return output
 
+    def _fold(self, output, dest_dirs, dirty, boundaries):
+        """
+        Replaces the files of every directory that is entirely owned by
+        the package (no hints, nothing filtered out by rules) with a single
+        entry for the topmost such directory below the boundaries.
+        """
+        # Anything above a dirty directory can't be folded either
+        unfoldable = set(boundaries)
+        for path in dirty:
+            while path not in unfoldable and path.startswith(boundaries):
+                unfoldable.add(path)
+                path = os.path.dirname(path)
+
+        folded, tops = {}, {}
+        for dest, src in output.items():
+            parent = os.path.dirname(src)
+            if parent not in tops:
+                top, path = None, parent
+                while path not in unfoldable and path.startswith(boundaries):
+                    top, path = path, os.path.dirname(path)
+                tops[parent] = top
+
+            top = tops[parent]
+            if top:
+                folded.setdefault(os.path.normpath(dest_dirs[top]), top)
+            else:
+                folded[dest] = src
+
+        return folded
+
+    def _owned(self, path):
+        """ Checks whether path is a link pointing inside any container """
+        return (os.path.islink(path) and
+                os.path.realpath(path).startswith(self.sources))
+
+    def _unfold(self, path, output):
+        """
+        Turns a folded directory link back into a real directory
+        by linking each of its children individually.
+        """
+        if self.dry_run:
+            return
+
+        target = os.path.realpath(path)
+        os.remove(path)
+        os.mkdir(path)
+        output['unfolded'].append(path)
+        for f in os.listdir(target):
+            link = (os.path.join(path, f),
+                    relative_link(os.path.join(target, f),
+                                  os.path.join(path, f)))
+            os.symlink(link[1], link[0])
+            output['links'].append(link)
+
+    def _unfold_parents(self, dest, checked, output):
+        """ Unfolds any directory link on the way to dest """
+        rel = os.path.relpath(os.path.dirname(dest), self.dest)
+        if rel == os.curdir or rel.startswith(os.pardir):
+            return
+
+        path = self.dest
+        for part in rel.split(os.sep):
+            path = os.path.join(path, part)
+            if path not in checked:
+                if self._owned(path):
+                    self._unfold(path, output)
+                checked.add(path)
+
     def create(self, files):
         # Set output
-        output = {'files': files, 'results': {}}
+        # (links: every intended link and its target, unfolded: directory
+        # links that were turned into directories)
+        output = {'files': [], 'results': {}, 'links': [], 'unfolded': []}
         output['results'].update({s: [] for s in self.STATES})
 
-        # Symlink all files
-        for src, dest in files:
+        # Symlink all files (folded directories might expand on the way)
+        pending, checked = files[::-1], set()
+        while pending:
+            src, dest = pending.pop()
+
+            # Never create links inside a (folded) source tree,
+            # even when not folding
+            self._unfold_parents(dest, checked, output)
+
+            if self.fold:
+                # A folded directory can't be linked where a directory
+                # already exists, so link its content instead
+                if (os.path.isdir(src) and os.path.isdir(dest) and
+                        os.path.realpath(dest) != os.path.realpath(src)):
+                    if self._owned(dest):
+                        self._unfold(dest, output)
+                    pending.extend(
+                        (os.path.join(src, f), os.path.join(dest, f))
+                        for f in sorted(os.listdir(src), reverse=True))
+                    continue
+
+            output['files'].append((src, dest))
+
             # Use absolute path if dest dir is a symlink,
             # otherwise use a relative path
             src_path = (src if os.path.islink(os.path.dirname(dest)) else
-                        os.path.relpath(src, os.path.dirname(dest)))
+                        relative_link(src, dest))
+            if src != dest:
+                output['links'].append((dest, src_path))
 
             flag = 'stowed'
             while True:
@@ -113,7 +353,7 @@ class Stow():
                         if not self.dry_run:
                             os.symlink(src_path, dest)
                         else:
-                            if os.path.isfile(dest):
+                            if os.path.lexists(dest):
                                 raise FileExistsError
                     except FileExistsError:
                         if os.path.islink(dest):
@@ -1,53 +1,109 @@
 #!/usr/bin/env python3
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from sys import exit
 import argparse
 import os
+import time
 
+from linkthedots import manifest, snapshot
 from linkthedots.config import Config, options
-from linkthedots.stow import Stow
+from linkthedots.fleet import deploy
+from linkthedots.metrics import Metrics
+from linkthedots.stow import Stow, packages
 from linkthedots.style import Style
 from linkthedots.functions import shrinkuser
 
 # Setting globals
 style = Style()
 
+# How many packages can be walked ahead of the one being reported
+PIPELINE_DEPTH = 4
+
+# Commandline arguments that narrow down what's stowed
+SELECTORS = ('select_containers', 'select_packages', 'select_path')
+
 
 def run():
     # Parse terminal arguments
     args = parse_args()
 
+    targets = parse_targets(args)
+    if targets:
+        # Neither metrics nor manifests are written for other roots
+        unsupported = [flag for flag, value in (
+            ('--check', args.check), ('--manifest', args.manifest),
+            ('--metrics', args.metrics),
+            ('--export-snapshot', args.export_snapshot)) if value]
+        if unsupported:
+            exit(f'{", ".join(unsupported)} can\'t be used with '
+                 '--target/--targets.')
+        return run_fleet(args.config, targets, args.jobs, cli_options(args))
+
+    # Checking a given manifest doesn't need the config at all
+    if args.check and args.manifest:
+        return run_check(args.manifest, args.jobs)
+
+    stats = Metrics()
+
     # Read config
     try:
         options = Config(conf=args.config).read()
     except Warning as e:
+        if args.metrics:
+            stats.write(args.metrics, success=False)
         exit(f'Config error: {e}')
+    stats.config_duration = time.time() - stats.start
 
     # Overwrite options from commandline args
-    options.update(
-        {k: v for k, v in vars(args).items() if v and k != 'config'})
+    options = {**options, **cli_options(args)}
 
-    if options.get('dry_run', None):
+    if args.check:
+        if not options['manifest']:
+            exit('No manifest to check. Use key "manifest" or --manifest.')
+        return run_check(options['manifest'], args.jobs)
+
+    if options['dry_run']:
         style.print('Running in dry (no change) mode...', 'notify')
 
     extra_opts = {k: v for k, v in options.items() if k != 'containers'}
-    containers = options.get('containers')
-
-    for ctnr, opt in containers.items():
+    # Folded links into any container (selected or not) are recognized
+    extra_opts['sources'] = [opt['source']
+                             for opt in options['containers'].values()]
+    containers = options['containers']
+
+    selected = options.get('select_containers')
+    if selected:
+        unknown = set(selected) - set(containers)
+        if unknown:
+            exit(f'Unknown container(s): {", ".join(sorted(unknown))}')
+        containers = {k: v for k, v in containers.items() if k in selected}
+
+    if args.export_snapshot:
+        return export_snapshots(containers, extra_opts)
+
+    # Only part of the links are going to be stowed when selecting,
+    # so keep the rest of the manifest. Links of skipped packages (and
+    # containers) are kept as well.
+    previous = {}
+    if options['manifest']:
         try:
-            try:
-                title = f'⠶ Stowing packages in "{ctnr}"'
-                src, dest = map(shrinkuser,
-                                (opt['source'], opt['destination']))
-            except (KeyError, AttributeError):
-                raise
-            else:
-                title = f'{title} ({src} -> {dest})'
-            finally:
-                style.print(title, 'header')
+            previous = manifest.load(options['manifest'])
+        except Warning:
+            pass
+    links = dict(previous) if any(options.get(s) for s in SELECTORS) else {}
+    skipped, unfolded = [], set()
+
+    success = False
+    try:
+        for ctnr, opt in containers.items():
+            src, dest = map(shrinkuser, (opt['source'], opt['destination']))
+            style.print(f'⠶ Stowing packages in "{ctnr}" ({src} -> {dest})',
+                        'header')
 
             # Check destination
-            if not opt.get('destination_create', False):
+            if not opt['destination_create']:
                 if not os.access(os.path.expanduser(opt['destination']),
                                  os.W_OK):
                     style.print((
@@ -55,16 +111,29 @@ def run():
                         ' Use key "destination_create" to force creation'
                         ' of destination.'
                     ), 'warning')
+                    skipped.append(os.path.expanduser(opt['source']))
                     continue
 
-            stow_container(ctnr, **opt, **extra_opts)
+            with stats.timer(ctnr):
+                for stow_result in stow_container(ctnr, stats, skipped,
+                                                  **opt, **extra_opts):
+                    manifest.record(links, stow_result)
+                    unfolded.update(stow_result['unfolded'])
 
-            if not options.get('verbose'):
+            if not options['verbose']:
                 style.prepend('check')
 
-        except (TypeError, KeyError, AttributeError):
-            style.print(
-                'Invalid source/destination setting. Skipping...', 'warning')
+        # Record deployed links for --check
+        if options['manifest'] and not options['dry_run']:
+            kept = {dest: target for dest, target
+                    in manifest.owned(previous, skipped).items()
+                    if dest not in unfolded}
+            manifest.save(options['manifest'], {**kept, **links})
+
+        success = True
+    finally:
+        if options['metrics']:
+            stats.write(options['metrics'], success=success)
 
 
 def parse_args():
@@ -84,48 +153,223 @@ def parse_args():
                             action='store_true' if option != 'verbose' else 'count',
                             help=desc)
 
+    # Fleet deployment
+    parser.add_argument('-t',
+                        '--target',
+                        dest='target',
+                        action='append',
+                        default=[],
+                        metavar='HOSTNAME:ROOT',
+                        help=('Stow the section of HOSTNAME under ROOT '
+                              'instead of this machine (can be repeated)'))
+    parser.add_argument('--targets',
+                        dest='targets',
+                        metavar='FILE',
+                        help=('Read targets from FILE '
+                              '(one HOSTNAME:ROOT per line)'))
+    parser.add_argument('-j',
+                        '--jobs',
+                        dest='jobs',
+                        type=int,
+                        help=('Number of targets to stow (or links to check) '
+                              'in parallel'))
+
+    # Selection (applied before walking anything)
+    parser.add_argument('--container',
+                        dest='select_containers',
+                        action='append',
+                        metavar='NAME',
+                        help='Stow only this container (can be repeated)')
+    parser.add_argument('--package',
+                        dest='select_packages',
+                        action='append',
+                        metavar='GLOB',
+                        help=('Stow only packages matching this pattern '
+                              '(can be repeated)'))
+    parser.add_argument('--path',
+                        dest='select_path',
+                        metavar='PATH',
+                        help=('Stow only this file or directory '
+                              '(relative to each package)'))
+
+    # Drift detection
+    parser.add_argument('--check',
+                        dest='check',
+                        action='store_true',
+                        help=('Only check that the links recorded in the '
+                              'manifest are still deployed'))
+    parser.add_argument('--manifest',
+                        dest='manifest',
+                        metavar='PATH',
+                        help='Path to the manifest of deployed links')
+
+    parser.add_argument('--export-snapshot',
+                        dest='export_snapshot',
+                        action='store_true',
+                        help=('Only write the snapshot of every container '
+                              'that has one set'))
+
+    parser.add_argument('--metrics',
+                        dest='metrics',
+                        metavar='PATH',
+                        help=('Write run metrics to PATH '
+                              '(Prometheus textfile format)'))
+
     return parser.parse_args()
 
 
-def stow_container(container, **opts):
-    source = os.path.expanduser(opts['source'])
-    is_pkg = opts.get('pkg')
+def cli_options(args):
+    """ Returns the options that were explicitly set from the commandline """
+    return {k: v for k, v in vars(args).items()
+            if v and (k in options or k in SELECTORS or
+                      k in ('manifest', 'metrics'))}
+
+
+def parse_targets(args):
+    """ Returns a list of (hostname, root) from the target arguments """
+    targets = list(args.target)
+    if args.targets:
+        try:
+            with open(args.targets, 'r') as f:
+                lines = (line.strip() for line in f)
+                targets += [line for line in lines
+                            if line and not line.startswith('#')]
+        except FileNotFoundError:
+            exit(f'Targets file "{args.targets}" not found.')
+
+    output = []
+    for target in targets:
+        hostname, _, root = target.partition(':')
+        if not (hostname and root):
+            exit(f'Invalid target "{target}" (expected HOSTNAME:ROOT).')
+        output.append((hostname, os.path.expanduser(root)))
+
+    return output
+
+
+def run_fleet(conf, targets, jobs, overrides):
+    if overrides.get('dry_run'):
+        style.print('Running in dry (no change) mode...', 'notify')
+
+    try:
+        results = deploy(conf, targets, workers=jobs, **overrides)
+    except Warning as e:
+        exit(f'Error: {e}')
+
+    for (hostname, root), stowed in results.items():
+        style.print(f'⠶ Stowing "{hostname}" to {shrinkuser(root)}', 'header')
+
+        for ctnr, pkg, stow_result in stowed:
+            if stow_result is None:
+                style.print(f'{ctnr}/{pkg}: Destination inaccessible.',
+                            'warning')
+                continue
+            if isinstance(stow_result, Warning):
+                style.print(f'{ctnr}/{pkg}: {stow_result} Skipping...',
+                            'warning')
+                continue
+
+            stats = ', '.join(f'{len(files)} file(s) {state}'
+                              for state, files in stow_result['results'].items()
+                              if files)
+            style.print(f'{ctnr}/{pkg}: {stats or "Nothing changed..."}',
+                        'check')
+
+
+def run_check(path, jobs):
+    try:
+        links = manifest.load(path)
+    except Warning as e:
+        exit(f'Manifest error: {e}')
+
+    results = manifest.check(links, workers=jobs)
+
+    code = 0
+    for state, code_bit in manifest.DRIFT.items():
+        for dest, target in results[state]:
+            style.print(f'{state.capitalize()}: {shrinkuser(dest)} -> {target}',
+                        'warning')
+        if results[state]:
+            code |= code_bit
+
+    stats = [f'{len(results["ok"])} link(s) OK'] + [
+        f'{len(results[state])} {state}' for state in manifest.DRIFT
+        if results[state]]
+    style.print(', '.join(stats), 'warning' if code else 'check', bold=True)
+
+    exit(code)
+
+
+def export_snapshots(containers, opts):
+    limits = {k: opts[k] for k in ('max_depth', 'max_entries', 'max_memory')}
+    for ctnr, opt in containers.items():
+        if not opt['snapshot']:
+            style.print(f'{ctnr}: No snapshot set. Use key "snapshot".',
+                        'warning')
+            continue
+
+        try:
+            count = snapshot.export(os.path.expanduser(opt['source']),
+                                    opt['snapshot'], **limits)
+        except (OSError, Warning) as e:
+            style.print(f'{ctnr}: {e}. Skipping...', 'warning')
+            continue
+
+        style.print(f'{ctnr}: {count} entries written to '
+                    f'{shrinkuser(opt["snapshot"])}', 'check')
 
-    # Work out packages to stow
-    pkgs = [container] if is_pkg else opts.get('packages',
-                                               os.listdir(source))
 
-    verbose = opts.get('verbose')
+def stow_container(container, stats, skipped=None, **opts):
+    """
+    Stows all packages of a container and returns their results.
+    Sources of packages skipped on the way are added to `skipped`.
+    """
+    verbose = opts['verbose']
+    output = []
 
-    # Stow packages
-    for pkg in sorted(pkgs):
+    def report(pkg, stow, stow_result):
         if verbose:
             title = f'Stowing {pkg}...'
             style.print(title, 'title', bold=False)
         else:
             title = None
 
-        # Work out include/exclude files
-        rule_fallback = ('include', [])
         try:
-            rule, s_files = opts.get('rules', {}).get(pkg, rule_fallback)
-        except ValueError:
-            # Empty rules
-            rule, s_files = rule_fallback
-
-        # Execute
-        stow_args = ('destination', 'name', 'dry_run', 'overwrite')
-        stow_args = {arg: opts.get(arg, None) for arg in stow_args}
-        stow_args.update({
-            'source': source if is_pkg else os.path.join(source, pkg),
-            rule: s_files
-        })
-
-        stow = Stow(**stow_args)
-        to_stow = stow.collect()
-        stow_result = stow.create(to_stow)
-
-        show_pkg_results(stow_result, title, **opts)
+            output.append(stow_result.result())
+        except Warning as e:
+            style.print(f'{e} Skipping...', 'warning')
+            if skipped is not None:
+                skipped.append(stow.src)
+            return
+
+        stats.add_stow(container, stow, output[-1])
+        with stats.timer(container, 'report'):
+            show_pkg_results(output[-1], title, **opts)
+
+    # Stow packages.
+    # Walking the source is read-only, so upcoming packages are collected
+    # in the background while links are created (strictly one package at a
+    # time, in order) and results are printed.
+    jobs = deque()
+    with ThreadPoolExecutor(max_workers=PIPELINE_DEPTH) as walkers, \
+            ThreadPoolExecutor(max_workers=1) as linker:
+        for pkg, stow_args in packages(container, opts):
+            stow = Stow(**stow_args)
+            to_stow = walkers.submit(stats.timed, container, 'collect',
+                                     stow.collect)
+            stow_result = linker.submit(
+                lambda stow=stow, to_stow=to_stow: stats.timed(
+                    container, 'create', stow.create, to_stow.result()))
+            jobs.append((pkg, stow, stow_result))
+
+            # Don't let the walkers run too far ahead
+            if len(jobs) >= PIPELINE_DEPTH:
+                report(*jobs.popleft())
+
+        while jobs:
+            report(*jobs.popleft())
+
+    return output
 
 
 def show_pkg_results(stow_result,
@@ -0,0 +1,16 @@
+import os
+from tempfile import TemporaryDirectory
+
+
+class TempDirMixin():
+    """ Gives every test a temporary directory (self.tmp) to work in """
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def makefiles(self, root, *paths):
+        """ Creates empty files (and their directories) under root """
+        for path in paths:
+            path = os.path.join(root, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
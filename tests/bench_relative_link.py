@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of relative link targets: os.path.relpath per file against
+functions.relative_link, for files spread over many directories.
+Not part of the test suite, run it directly:
+
+    python -m tests.bench_relative_link [FILES] [DIRS]
+"""
+from sys import argv
+import os
+import timeit
+
+from linkthedots.functions import _relpath, relative_link
+
+
+def main(files=100000, dirs=1000, repeat=3):
+    pairs = [(f'/home/user/dotfiles/pkg/.config/app{i % dirs}/file{i}',
+              f'/home/user/.config/app{i % dirs}/file{i}')
+             for i in range(files)]
+
+    def plain():
+        for src, dest in pairs:
+            os.path.relpath(src, os.path.dirname(dest))
+
+    def cached():
+        _relpath.cache_clear()  # Every run starts cold
+        for src, dest in pairs:
+            relative_link(src, dest)
+
+    assert all(relative_link(src, dest) ==
+               os.path.relpath(src, os.path.dirname(dest))
+               for src, dest in pairs)
+
+    print(f'{files} files in {dirs} directories, best of {repeat}:')
+    results = {}
+    for name, func in (('os.path.relpath', plain),
+                       ('relative_link', cached)):
+        results[name] = min(timeit.repeat(func, number=1, repeat=repeat))
+        print(f'  {name:<16} {results[name]:.3f} s')
+    speedup = results['os.path.relpath'] / results['relative_link']
+    print(f'  speedup          {speedup:.1f}x')
+
+
+if __name__ == '__main__':
+    main(*map(int, argv[1:3]))
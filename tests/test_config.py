@@ -189,6 +189,7 @@ class TestConfig(unittest.TestCase):
                     },
                     'fake': {
                         'source': '/this/is/the/source',
+                        'destination': '/this/is/the/destination',
                         'destination_create': True,
                         'packages': ['pkg1', 'pkg2', 'pkg1'],
                         'pkg': True,
@@ -204,32 +205,92 @@ class TestConfig(unittest.TestCase):
             'overwrite': True,
             'dry_run': False,
             'group_output': False,  # Is added
+            'verbose': False,  # Defaults
+            'fold': False,
+            'manifest': None,
+            'metrics': None,
+            'max_depth': None,  # No walking limits
+            'max_entries': None,
+            'max_memory': None,
             'containers': {
                 'faker': {
                     'source': '/path/to/src',
                     'destination': '/path/to/dest',
                     'packages': {'pkg1', 'pkg2'},  # A set
+                    'destination_create': False,
+                    'pkg': False,
+                    'snapshot': None,
                     'rules': {
-                        'pkg1': ['include', ['file']],  # A list in a list
-                        'pkg2': ['exclude', ['file']]  # Key was retained
+                        'pkg1': ('include', ('file',)),  # A tuple in a tuple
+                        'pkg2': ('exclude', ('file',))  # Key was retained
                     }
                 },
                 'fake': {
                     'source': '/this/is/the/source',  # Overwrites general value
+                    'destination': '/this/is/the/destination',
                     'destination_create': True,
                     'packages': {'pkg1', 'pkg2'},  # list->set
                     'pkg': True,
+                    'snapshot': None,
                     'rules': {
-                        'fake': ['include', ['file']]  # Changed
+                        'fake': ('include', ('file',))  # Changed
                     }
                 },
                 'fakeb': {
                     'source': 'fake/src',
-                    'destination': 'fake/dest'
+                    'destination': 'fake/dest',
+                    'packages': None,
+                    'destination_create': False,
+                    'pkg': False,
+                    'snapshot': None,
+                    'rules': {}
                 }
             }
         }
 
         output = self.makeconf(fake_config).read()
 
-        self.assertDictEqual(output, expected)
+        self.assertEqual(output, expected)
+
+        # Output is read-only
+        with self.assertRaises(TypeError):
+            output['containers']['fake']['pkg'] = False
+
+    def test_missing_source_destination(self):
+        self.fake_config['general'] = {'containers': {'fake': {}}}
+        self.fake_config[self.hostname] = {'containers': {'fake': {}}}
+
+        with self.assertRaises(Warning) as e:
+            self.makeconf(self.fake_config).read()
+
+        error = str(e.exception)
+        self.assertIn(f'$.{self.hostname}.containers.fake: No "source"', error)
+        self.assertIn(
+            f'$.{self.hostname}.containers.fake: No "destination"', error)
+
+    def test_all_errors_reported(self):
+        self.fake_config['general'] = {
+            'dry_run': 'yes',
+            'containers': {'fake': '/path/to/fake'}
+        }
+        self.fake_config[self.hostname] = {
+            'containers': {
+                'fake': {
+                    'destination': 5,
+                    'packages': [1, 2],
+                    'rules': {'pkg': 5, 'my pkg': ['maybe', 'file']}
+                }
+            }
+        }
+
+        with self.assertRaises(Warning) as e:
+            self.makeconf(self.fake_config).read()
+
+        error = str(e.exception)
+        ctnr = f'$.{self.hostname}.containers.fake'
+        for path in ('$.general.dry_run',
+                     f'{ctnr}.destination',
+                     f'{ctnr}.packages',
+                     f'{ctnr}.rules.pkg',
+                     f'{ctnr}.rules["my pkg"][0]'):
+            self.assertIn(f'{path}: ', error)
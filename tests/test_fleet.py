@@ -0,0 +1,74 @@
+import unittest
+from unittest.mock import patch
+from json import dump
+import os
+
+from linkthedots import fleet
+from linkthedots.stow import Stow
+from . import TempDirMixin
+
+
+class TestFleet(TempDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = os.path.join(self.tmp.name, 'dots')
+        self.makefiles(self.source, 'vim/.vimrc', 'git/.gitconfig#one',
+                       'git/.gitconfig#two')
+
+        self.conf = os.path.join(self.tmp.name, 'config.json')
+        with open(self.conf, 'w') as f:
+            dump({
+                'general': {'containers': {'dots': self.source}},
+                'one': {'containers': {'dots': {
+                    'destination': '~',
+                    'destination_create': True
+                }}},
+                'two': {'containers': {'dots': {
+                    'destination': '/home/two',
+                    'destination_create': True
+                }}}
+            }, f)
+
+    def root(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_reroot(self):
+        self.assertEqual(fleet.reroot('~', '/r'), '/r')
+        self.assertEqual(fleet.reroot('~/.config', '/r'), '/r/.config')
+        self.assertEqual(fleet.reroot('/etc/xdg', '/r'), '/r/etc/xdg')
+
+    def test_deploy(self):
+        targets = [('one', self.root('a')), ('one', self.root('b')),
+                   ('two', self.root('c'))]
+
+        results = fleet.deploy(self.conf, targets, workers=2)
+
+        self.assertEqual(list(results), targets)
+        for root, home in (('a', ''), ('b', ''), ('c', 'home/two')):
+            home = os.path.join(self.root(root), home)
+            self.assertTrue(os.path.islink(os.path.join(home, '.vimrc')))
+            self.assertTrue(os.path.islink(os.path.join(home, '.gitconfig')))
+
+        gitconfig = os.path.join(self.root('c'), 'home/two/.gitconfig')
+        self.assertTrue(os.path.realpath(gitconfig).endswith('#two'))
+
+    def test_walk_once(self):
+        targets = [('one', self.root('a')), ('one', self.root('b')),
+                   ('two', self.root('c'))]
+        with patch.object(Stow, 'walk', autospec=True,
+                          side_effect=Stow.walk) as walk:
+            fleet.deploy(self.conf, targets, workers=1)
+
+        # One walk per package, regardless of the number of hosts and targets
+        self.assertEqual(walk.call_count, 2)
+
+    def test_skip_over_limits(self):
+        os.makedirs(os.path.join(self.source, 'deep', 'a', 'b', 'c'))
+        targets = [('one', self.root('a')), ('two', self.root('b'))]
+
+        results = fleet.deploy(self.conf, targets, workers=1, max_depth=2)
+
+        for target in targets:
+            stowed = {pkg: result for _, pkg, result in results[target]}
+            self.assertIsInstance(stowed['deep'], Warning)
+            self.assertEqual(len(stowed['vim']['results']['stowed']), 1)
@@ -1,7 +1,9 @@
 import unittest
+from unittest import mock
 import os
 
 import linkthedots.functions as functions
+from . import TempDirMixin
 
 
 class TestFunc(unittest.TestCase):
@@ -15,3 +17,86 @@ class TestFunc(unittest.TestCase):
 
         # Assert
         self.assertEqual(path, original)
+
+    def test_relative_link(self):
+        cases = [
+            ('/src/pkg/.config/app/file', '/dest/.config/app/file'),
+            ('/src/pkg/.config/app/other', '/dest/.config/app/other'),
+            ('/src/pkg/file', '/src/pkg/link'),
+            ('/src/pkg/.bashrc', '/dest/.bashrc'),
+            ('relative/src/file', 'relative/dest/deeper/file')
+        ]
+
+        for src, dest in cases:
+            self.assertEqual(functions.relative_link(src, dest),
+                             os.path.relpath(src, os.path.dirname(dest)))
+
+
+class TestWalk(TempDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.top = self.tmp.name
+        self.makefiles(self.top, 'a/b/c/file', 'a/file', 'd/file')
+
+    def walk(self, **kwargs):
+        return sorted(os.path.relpath(os.path.join(root, name), self.top)
+                      for root, name, _ in functions.walk(self.top, **kwargs))
+
+    def test_walk(self):
+        expected = sorted(
+            os.path.relpath(os.path.join(root, name), self.top)
+            for root, dirs, files in os.walk(self.top)
+            for name in dirs + files)
+
+        self.assertEqual(self.walk(), expected)
+
+    def test_descend(self):
+        output = self.walk(descend=lambda root, name: name != 'a')
+
+        self.assertIn('a', output)
+        self.assertNotIn('a/file', output)
+        self.assertIn('d/file', output)
+
+    def test_symlink_loop(self):
+        os.symlink(self.top, os.path.join(self.top, 'a', 'b', 'loop'))
+        os.symlink(os.path.join(self.top, 'd'), os.path.join(self.top, 'e'))
+
+        output = self.walk()
+
+        self.assertIn('a/b/loop', output)
+        self.assertNotIn('a/b/loop/a', output)
+        # Not a loop, just another way in
+        self.assertIn('e/file', output)
+
+    def test_replay(self):
+        def descend(root, name):
+            return name != 'b'
+
+        walked = list(functions.walk(self.top))
+        a = os.path.join(self.top, 'a')
+
+        self.assertEqual(list(functions.replay(walked, self.top, descend)),
+                         list(functions.walk(self.top, descend)))
+        self.assertEqual(list(functions.replay(walked, a, descend)),
+                         list(functions.walk(a, descend)))
+
+    def test_limits(self):
+        with self.assertRaises(Warning):
+            self.walk(max_depth=2)
+        with self.assertRaises(Warning):
+            self.walk(max_entries=3)
+
+        self.assertEqual(len(self.walk(max_depth=3, max_entries=7)), 7)
+
+    def test_memory_limit(self):
+        self.assertGreater(functions.memory_used(), 0)
+
+        with mock.patch.object(functions, 'MEMORY_CHECK_INTERVAL', 1):
+            with mock.patch.object(functions, 'memory_used',
+                                   return_value=65 * 1024 * 1024):
+                with self.assertRaises(Warning):
+                    self.walk(max_memory=64)
+            # Memory that was freed doesn't count anymore
+            with mock.patch.object(functions, 'memory_used',
+                                   return_value=63 * 1024 * 1024):
+                self.assertEqual(len(self.walk(max_memory=64)), 7)
@@ -0,0 +1,170 @@
+import unittest
+from unittest import mock
+from contextlib import ExitStack, redirect_stdout
+from json import dump
+from socket import gethostname
+import io
+import os
+import threading
+import time
+
+import main
+from linkthedots import manifest
+from linkthedots.metrics import Metrics
+from linkthedots.stow import Stow
+from . import TempDirMixin
+
+
+class TestPipeline(TempDirMixin, unittest.TestCase):
+    PACKAGES = ('a', 'b', 'c', 'd', 'e', 'f', 'g')
+
+    def setUp(self):
+        super().setUp()
+        self.container = os.path.join(self.tmp.name, 'container')
+        self.makefiles(self.container,
+                       *(f'{pkg}/.{pkg}rc' for pkg in self.PACKAGES))
+
+        self.dest = os.path.join(self.tmp.name, 'dest')
+        os.makedirs(self.dest)
+        self.collect = Stow.collect
+
+    def stow(self, collect=None, create=None, skipped=None):
+        """ Stows the container, returning results and printed output """
+        opts = {
+            'source': self.container,
+            'destination': self.dest,
+            'name': 'host',
+            'pkg': False,
+            'packages': None,
+            'rules': {},
+            'dry_run': False,
+            'overwrite': False,
+            'fold': False,
+            'max_depth': None,
+            'max_entries': None,
+            'max_memory': None,
+            'snapshot': None,
+            'verbose': 2,
+            'group_output': False
+        }
+
+        out = io.StringIO()
+        with ExitStack() as stack:
+            stack.enter_context(redirect_stdout(out))
+            for name, func in (('collect', collect), ('create', create)):
+                if func:
+                    stack.enter_context(mock.patch.object(Stow, name, func))
+            output = main.stow_container('container', Metrics(), skipped,
+                                          **opts)
+
+        return output, out.getvalue()
+
+    @staticmethod
+    def package(stow):
+        return os.path.basename(stow.src)
+
+    def test_order(self):
+        delays = dict(zip(self.PACKAGES, (0.05, 0, 0.03, 0, 0.01, 0.02, 0)))
+        collect = self.collect
+
+        def slow_collect(stow):
+            time.sleep(delays[self.package(stow)])
+            return collect(stow)
+
+        output, printed = self.stow(collect=slow_collect)
+
+        srcs = [os.path.join(self.container, pkg, f'.{pkg}rc')
+                for pkg in self.PACKAGES]
+        self.assertEqual([result['files'][0][0] for result in output], srcs)
+        positions = [printed.index(main.shrinkuser(src)) for src in srcs]
+        self.assertEqual(positions, sorted(positions))
+
+    def test_skip_warning(self):
+        collect = self.collect
+
+        def failing_collect(stow):
+            if self.package(stow) == 'c':
+                raise Warning('Too many entries.')
+            return collect(stow)
+
+        skipped = []
+        output, printed = self.stow(collect=failing_collect, skipped=skipped)
+
+        self.assertEqual(skipped, [os.path.join(self.container, 'c')])
+        self.assertIn('Too many entries. Skipping...', printed)
+        self.assertEqual(len(output), len(self.PACKAGES) - 1)
+        self.assertFalse(os.path.lexists(os.path.join(self.dest, '.crc')))
+        self.assertTrue(os.path.islink(os.path.join(self.dest, '.grc')))
+
+    def test_depth(self):
+        lock, in_flight, peak = threading.Lock(), set(), [0]
+        collect, create = self.collect, Stow.create
+
+        def tracked_collect(stow):
+            with lock:
+                in_flight.add(stow.src)
+                peak[0] = max(peak[0], len(in_flight))
+            return collect(stow)
+
+        def slow_create(stow, files):
+            time.sleep(0.02)
+            output = create(stow, files)
+            with lock:
+                in_flight.discard(stow.src)
+            return output
+
+        output, _ = self.stow(collect=tracked_collect, create=slow_create)
+
+        self.assertEqual(len(output), len(self.PACKAGES))
+        self.assertEqual(peak[0], main.PIPELINE_DEPTH)
+
+    def test_manifest_keeps_skipped(self):
+        path = os.path.join(self.tmp.name, 'manifest.json')
+        dest = os.path.join(self.tmp.name, 'gone')
+        manifest.save(path, {
+            os.path.join(self.dest, '.crc'): '../container/c/.crc',
+            os.path.join(self.dest, '.old'): '../container/a/.old',
+            os.path.join(dest, '.xrc'): '../other/x/.xrc'
+        })
+
+        conf = os.path.join(self.tmp.name, 'config.json')
+        with open(conf, 'w') as f:
+            dump({
+                'general': {'manifest': path, 'containers': {
+                    'container': self.container,
+                    'other': os.path.join(self.tmp.name, 'other')
+                }},
+                gethostname(): {'containers': {'container': self.dest,
+                                               'other': dest}}
+            }, f)
+
+        collect = self.collect
+
+        def failing_collect(stow):
+            if self.package(stow) == 'c':
+                raise Warning('Too many entries.')
+            return collect(stow)
+
+        argv = ['main.py', '-c', conf]
+        with mock.patch('sys.argv', argv), \
+                mock.patch.object(Stow, 'collect', failing_collect), \
+                redirect_stdout(io.StringIO()):
+            main.run()
+
+        links = manifest.load(path)
+        # Skipped package and inaccessible container are still monitored
+        self.assertIn(os.path.join(self.dest, '.crc'), links)
+        self.assertIn(os.path.join(dest, '.xrc'), links)
+        # Stowed packages are recorded afresh
+        self.assertIn(os.path.join(self.dest, '.grc'), links)
+        self.assertNotIn(os.path.join(self.dest, '.old'), links)
+
+    def test_fleet_rejects_local_options(self):
+        argv = ['main.py', '--target', f'host:{self.dest}', '--metrics',
+                os.path.join(self.tmp.name, 'metrics.prom')]
+        with mock.patch('sys.argv', argv):
+            with self.assertRaises(SystemExit) as exit:
+                main.run()
+
+        self.assertIn('--metrics', str(exit.exception))
+        self.assertEqual(os.listdir(self.dest), [])
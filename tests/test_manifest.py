@@ -0,0 +1,73 @@
+import unittest
+import os
+
+from linkthedots import manifest
+from . import TempDirMixin
+
+
+class TestManifest(TempDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.tmp.name, 'state', 'manifest.json')
+
+    def join(self, *paths):
+        return os.path.join(self.tmp.name, *paths)
+
+    def test_no_manifest(self):
+        with self.assertRaises(Warning):
+            manifest.load(self.path)
+
+    def test_save_load(self):
+        links = {'/a/b': '../c', '/a/d': '/e'}
+
+        manifest.save(self.path, links)
+
+        self.assertEqual(manifest.load(self.path), links)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)),
+                         ['manifest.json'])
+
+    def test_record(self):
+        links = {'/dest/.config': 'src/pkg1/.config'}
+        stow_result = {
+            'unfolded': ['/dest/.config'],
+            'links': [('/dest/.config/one', '../src/pkg1/.config/one'),
+                      ('/dest/.config/two', '../src/pkg2/.config/two')]
+        }
+
+        manifest.record(links, stow_result)
+
+        self.assertEqual(sorted(links),
+                         ['/dest/.config/one', '/dest/.config/two'])
+
+    def test_owned(self):
+        links = {'/dest/.vimrc': '../src/vim/.vimrc',
+                 '/dest/.config/git': '../../src/git/.config/git',
+                 '/dest/.gitconfig': '/src/git/.gitconfig',
+                 '/dest/.gitk': '../src/gitk/.gitk'}
+
+        self.assertEqual(manifest.owned(links, ['/src/git', '/other']),
+                         {'/dest/.config/git': '../../src/git/.config/git',
+                          '/dest/.gitconfig': '/src/git/.gitconfig'})
+
+    def test_check(self):
+        open(self.join('file'), 'w').close()
+        os.symlink('file', self.join('ok'))
+        os.symlink(self.join('file'), self.join('absolute'))
+        os.symlink('gone', self.join('dangling'))
+        os.symlink('other', self.join('elsewhere'))
+        open(self.join('real'), 'w').close()
+
+        links = {self.join(name): 'file'
+                 for name in ('ok', 'absolute', 'missing', 'elsewhere',
+                              'real')}
+        links[self.join('dangling')] = 'gone'
+
+        results = manifest.check(links)
+
+        def names(state):
+            return sorted(os.path.basename(d) for d, _ in results[state])
+
+        self.assertEqual(names('ok'), ['absolute', 'ok'])
+        self.assertEqual(names('missing'), ['missing'])
+        self.assertEqual(names('foreign'), ['elsewhere', 'real'])
+        self.assertEqual(names('dangling'), ['dangling'])
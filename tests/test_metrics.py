@@ -0,0 +1,52 @@
+import unittest
+from types import SimpleNamespace
+import os
+
+from linkthedots.metrics import Metrics
+from linkthedots.stow import Stow
+from . import TempDirMixin
+
+
+class TestMetrics(TempDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.tmp.name, 'linkthedots.prom')
+
+    def read(self):
+        with open(self.path, 'r') as f:
+            return dict(line.rsplit(' ', 1) for line in f.read().splitlines()
+                        if not line.startswith('#'))
+
+    def test_write(self):
+        stats = Metrics()
+        with stats.timer('dots'):
+            stats.timed('dots', 'collect', lambda: None)
+        stow_result = {'results': {s: [] for s in Stow.STATES}}
+        stow_result['results']['stowed'] = [('src', 'dest')] * 3
+        stats.add_stow('do"ts', SimpleNamespace(walked=10), stow_result)
+
+        stats.write(self.path)
+
+        output = self.read()
+        self.assertEqual(output['linkthedots_links{container="do\\"ts",'
+                                'state="stowed"}'], '3')
+        self.assertEqual(output['linkthedots_links{container="do\\"ts",'
+                                'state="skipped"}'], '0')
+        self.assertEqual(
+            output['linkthedots_walked_entries{container="do\\"ts"}'], '10')
+        self.assertIn('linkthedots_phase_duration_seconds{container="dots",'
+                      'phase="collect"}', output)
+        self.assertIn('linkthedots_container_duration_seconds'
+                      '{container="dots"}', output)
+        self.assertEqual(output['linkthedots_last_run_success'], '1')
+
+    def test_last_success(self):
+        Metrics().write(self.path)
+        last_success = self.read()['linkthedots_last_success_timestamp_seconds']
+
+        Metrics().write(self.path, success=False)
+
+        output = self.read()
+        self.assertEqual(output['linkthedots_last_run_success'], '0')
+        self.assertEqual(output['linkthedots_last_success_timestamp_seconds'],
+                         last_success)
@@ -0,0 +1,106 @@
+import unittest
+from unittest import mock
+import os
+
+from linkthedots import snapshot
+from linkthedots.functions import walk
+from linkthedots.stow import Stow
+from . import TempDirMixin
+
+
+class TestSnapshot(TempDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.container = os.path.join(self.tmp.name, 'container')
+        self.makefiles(self.container,
+                       'pkg/.bashrc',
+                       'pkg/.config/app/config',
+                       'pkg/.config/app-other/config',
+                       'pkg/.config/app#other/config',
+                       'pkg/.vimrc#host',
+                       'git/.gitconfig')
+
+        # Some time in the past, so any change shows up in the mtimes
+        for root, dirs, _ in os.walk(self.container):
+            for d in dirs + ['.']:
+                os.utime(os.path.join(root, d), ns=(0, 10 ** 18))
+
+        self.snapshot = os.path.join(self.tmp.name, 'snapshot')
+        self.count = snapshot.export(self.container, self.snapshot)
+
+    def test_walk(self):
+        def descend(root, d):
+            return '#' not in d
+
+        top = os.path.join(self.container, 'pkg')
+        self.assertEqual(self.count, 13)
+        self.assertEqual(
+            sorted(snapshot.walk(self.snapshot, self.container, top, descend)),
+            sorted(walk(top, descend)))
+        # Outside the snapshot
+        self.assertIsNone(snapshot.walk(self.snapshot, self.container,
+                                        self.tmp.name))
+
+    def collect(self, **kwargs):
+        stow = Stow(source=os.path.join(self.container, 'pkg'),
+                    destination='/dest',
+                    name='host',
+                    container=self.container,
+                    **kwargs)
+        return sorted(stow.collect())
+
+    def test_collect(self):
+        self.assertEqual(self.collect(snapshot=self.snapshot), self.collect())
+        self.assertEqual(self.collect(snapshot=self.snapshot, path='.config'),
+                         self.collect(path='.config'))
+
+    def test_stale(self):
+        top = os.path.join(self.container, 'pkg')
+        open(os.path.join(top, '.config', 'app', 'new'), 'w').close()
+
+        self.assertIsNone(snapshot.walk(self.snapshot, self.container, top))
+        # Other packages are still up to date
+        self.assertIsNotNone(snapshot.walk(
+            self.snapshot, self.container,
+            os.path.join(self.container, 'git')))
+        # Walked instead
+        self.assertIn(('/dest/.config/app/new', os.path.join(
+            top, '.config', 'app', 'new')),
+            [(d, s) for s, d in self.collect(snapshot=self.snapshot)])
+
+    def test_corrupt(self):
+        top = os.path.join(self.container, 'pkg')
+        expected = self.collect()
+        with open(self.snapshot, 'rb') as f:
+            data = f.read()
+
+        def corrupt(data):
+            with open(self.snapshot, 'wb') as f:
+                f.write(data)
+
+        # Truncated records, truncated paths, path offsets out of range
+        table_end = snapshot.HEADER.size + self.count * snapshot.RECORD.size
+        offset = snapshot.HEADER.size + snapshot.RECORD.size
+        for data in (data[:40], data[:-5],
+                     data[:offset] + b'\xff' * 4 + data[offset + 4:],
+                     b'', data[:table_end]):
+            corrupt(data)
+            self.assertIsNone(snapshot.walk(self.snapshot, self.container,
+                                            top))
+            # Walked instead
+            self.assertEqual(self.collect(snapshot=self.snapshot), expected)
+
+    def test_close(self):
+        top = os.path.join(self.container, 'pkg')
+        with mock.patch.object(snapshot.Snapshot, 'close', autospec=True,
+                               side_effect=snapshot.Snapshot.close) as close:
+            entries = snapshot.walk(self.snapshot, self.container, top)
+            self.assertEqual(close.call_count, 0)
+            list(entries)
+            self.assertEqual(close.call_count, 1)
+
+            # Stale, closed right away
+            open(os.path.join(top, 'new'), 'w').close()
+            self.assertIsNone(snapshot.walk(self.snapshot, self.container,
+                                            top))
+            self.assertEqual(close.call_count, 2)
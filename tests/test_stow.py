@@ -0,0 +1,198 @@
+import unittest
+import os
+
+from linkthedots.stow import Stow, packages
+from . import TempDirMixin
+
+
+class TestFold(TempDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.container = os.path.join(self.tmp.name, 'container')
+        self.dest = os.path.join(self.tmp.name, 'dest')
+        os.makedirs(self.dest)
+
+    def stow(self, pkg, **kwargs):
+        stow = Stow(source=os.path.join(self.container, pkg),
+                    destination=self.dest,
+                    name='host',
+                    fold=True,
+                    container=self.container,
+                    **kwargs)
+        return stow.create(stow.collect())
+
+    def test_fold(self):
+        self.makefiles(self.container, 'pkg/.icons/a/1', 'pkg/.icons/a/2',
+                       'pkg/.icons/b/3')
+
+        result = self.stow('pkg')
+
+        icons = os.path.join(self.dest, '.icons')
+        self.assertTrue(os.path.islink(icons))
+        self.assertEqual(len(result['results']['stowed']), 1)
+        self.assertTrue(os.path.isfile(os.path.join(icons, 'b', '3')))
+
+    def test_no_fold_with_hints_or_rules(self):
+        self.makefiles(self.container, 'pkg/.vim/a/vimrc#host',
+                       'pkg/.vim/b/1', 'pkg/.vim/c/1', 'pkg/.vim/c/2')
+
+        self.stow('pkg', exclude=['c/2'])
+
+        vim = os.path.join(self.dest, '.vim')
+        self.assertFalse(os.path.islink(vim))
+        self.assertFalse(os.path.islink(os.path.join(vim, 'a')))
+        self.assertTrue(os.path.islink(os.path.join(vim, 'a', 'vimrc')))
+        self.assertTrue(os.path.islink(os.path.join(vim, 'b')))
+        self.assertFalse(os.path.islink(os.path.join(vim, 'c')))
+        self.assertFalse(os.path.lexists(os.path.join(vim, 'c', '2')))
+
+    def test_no_fold_with_other_hosts(self):
+        self.makefiles(self.container, 'pkg/.config/app/conf',
+                       'pkg/.config/app/secret#other',
+                       'pkg/.config/app/sub#other/x')
+
+        result = self.stow('pkg')
+
+        app = os.path.join(self.dest, '.config', 'app')
+        self.assertFalse(os.path.islink(os.path.join(self.dest, '.config')))
+        self.assertFalse(os.path.islink(app))
+        self.assertEqual(sorted(os.listdir(app)), ['conf'])
+        self.assertEqual(len(result['results']['stowed']), 1)
+
+    def test_dry_run(self):
+        # Anything at the destination counts as existing, like on a real run
+        self.makefiles(self.container, 'pkg/.bashrc', 'pkg/.vim/vimrc')
+        os.symlink('nowhere', os.path.join(self.dest, '.bashrc'))
+        os.mkdir(os.path.join(self.dest, '.vim'))
+
+        dry = self.stow('pkg', dry_run=True)['results']
+        real = self.stow('pkg')['results']
+
+        self.assertEqual(dry, real)
+        self.assertEqual(len(real['restowed']), 1)
+
+    def test_restow(self):
+        self.makefiles(self.container, 'pkg/.icons/a/1')
+
+        self.stow('pkg')
+        result = self.stow('pkg')
+
+        self.assertEqual(len(result['results']['restowed']), 1)
+        self.assertTrue(os.path.islink(os.path.join(self.dest, '.icons')))
+
+    def test_unfold(self):
+        self.makefiles(self.container, 'pkg1/.config/one/1',
+                       'pkg2/.config/two/2')
+
+        self.stow('pkg1')
+        self.assertTrue(os.path.islink(os.path.join(self.dest, '.config')))
+
+        self.stow('pkg2')
+
+        config = os.path.join(self.dest, '.config')
+        self.assertFalse(os.path.islink(config))
+        self.assertTrue(os.path.islink(os.path.join(config, 'one')))
+        self.assertTrue(os.path.islink(os.path.join(config, 'two')))
+        self.assertTrue(os.path.isfile(os.path.join(config, 'one', '1')))
+        # Nothing was written into the other package
+        self.assertFalse(os.path.lexists(
+            os.path.join(self.container, 'pkg1', '.config', 'two')))
+
+
+    def test_unfold_other_container(self):
+        other = os.path.join(self.tmp.name, 'other')
+        self.makefiles(self.container, 'pkg/.config/one/1')
+        self.makefiles(other, 'pkg/.config/two/2')
+        sources = (self.container, other)
+
+        self.stow('pkg', sources=sources)
+        self.assertTrue(os.path.islink(os.path.join(self.dest, '.config')))
+
+        # Not folding, still never linking into the first container
+        stow = Stow(source=os.path.join(other, 'pkg'), destination=self.dest,
+                    name='host', container=other, sources=sources)
+        stow.create(stow.collect())
+
+        config = os.path.join(self.dest, '.config')
+        self.assertFalse(os.path.islink(config))
+        self.assertTrue(os.path.islink(os.path.join(config, 'one')))
+        self.assertTrue(os.path.isfile(os.path.join(config, 'two', '2')))
+        self.assertFalse(os.path.lexists(
+            os.path.join(self.container, 'pkg', '.config', 'two')))
+
+
+class TestSelect(TempDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.container = self.tmp.name
+        self.makefiles(self.container,
+                       'nvim/.config/nvim/init.lua',
+                       'nvim/.config/nvim/lua/plugins.lua',
+                       'nvim/.config/nvim#other/init.lua',
+                       'nvim/.bashrc',
+                       'neomutt/.muttrc',
+                       'git/.gitconfig')
+
+        self.opts = {
+            'source': self.container,
+            'destination': '/dest',
+            'name': 'host',
+            'pkg': False,
+            'packages': None,
+            'rules': {},
+            'dry_run': True,
+            'overwrite': False,
+            'fold': False,
+            'max_depth': None,
+            'max_entries': None,
+            'max_memory': None,
+            'snapshot': None
+        }
+
+    def test_packages(self):
+        pkgs = [pkg for pkg, _ in packages(
+            'dots', {**self.opts, 'select_packages': ['n*', 'git']})]
+
+        self.assertEqual(pkgs, ['git', 'neomutt', 'nvim'])
+
+        pkgs = [pkg for pkg, _ in packages(
+            'dots', {**self.opts, 'select_packages': ['nv?m']})]
+
+        self.assertEqual(pkgs, ['nvim'])
+
+    def collect(self, path, sources=False):
+        stow = Stow(source=os.path.join(self.container, 'nvim'),
+                    destination='/dest',
+                    name='host',
+                    path=path)
+        return sorted((dest, src) if sources else dest
+                      for src, dest in stow.collect())
+
+    def test_path(self):
+        self.assertEqual(self.collect('.config/nvim/'),
+                         ['/dest/.config/nvim/init.lua',
+                          '/dest/.config/nvim/lua/plugins.lua'])
+        self.assertEqual(self.collect('.bashrc'), ['/dest/.bashrc'])
+        self.assertEqual(self.collect('.config/nvim#other'), [])
+        self.assertEqual(self.collect('nonexistent'), [])
+
+        with self.assertRaises(Warning):
+            self.collect('../git')
+
+    def test_path_hints(self):
+        self.makefiles(os.path.join(self.container, 'nvim'), '.bashrc#host',
+                       'dir/a', 'dir/b', 'dir#host/a', 'dir#other/c')
+        everything = self.collect(None, sources=True)
+
+        # Same as the full walk, host-specific files taking priority
+        for path in ('.bashrc', 'dir', 'dir#host', 'dir/a'):
+            dest = os.path.join('/dest', path.replace('#host', ''))
+            self.assertEqual(
+                self.collect(path, sources=True),
+                [link for link in everything
+                 if link[0] == dest or link[0].startswith(dest + os.sep)])
+
+        self.assertEqual(self.collect('.bashrc', sources=True),
+                         [('/dest/.bashrc', os.path.join(
+                             self.container, 'nvim', '.bashrc#host'))])
+        self.assertEqual(self.collect('dir'), ['/dest/dir/a', '/dest/dir/b'])